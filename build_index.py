@@ -1,6 +1,6 @@
 from pathlib import Path
 from scribby_pi.knowledge import KnowledgeBase
-from scribby_pi.config import (CORPUS_DIR, INDEX_DIR, EMBEDDING_MODEL)
+from scribby_pi.config import (CORPUS_DIR, INDEX_DIR, EMBEDDING_MODEL, ONNX_EMBEDDING_DIR)
 
 def main():
     print("Building knowledge base index...")
@@ -8,7 +8,8 @@ def main():
     kb = KnowledgeBase(
         corpus_dir=Path(CORPUS_DIR),
         index_dir=Path(INDEX_DIR),
-        embedding_model_name=EMBEDDING_MODEL
+        embedding_model_name=EMBEDDING_MODEL,
+        onnx_model_dir=Path(ONNX_EMBEDDING_DIR)
     )
     kb.build_index()
     print("Index built successfully.")
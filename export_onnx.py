@@ -0,0 +1,29 @@
+from pathlib import Path
+from scribby_pi.config import EMBEDDING_MODEL, ONNX_EMBEDDING_DIR, ONNX_MODEL_FILE
+
+# Requires the optional dependencies: pip install "optimum[onnxruntime]"
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from optimum.onnxruntime import ORTModelForFeatureExtraction
+from transformers import AutoTokenizer
+
+
+def main():
+    print(f"Exporting {EMBEDDING_MODEL} to ONNX...")
+    out_dir = Path(ONNX_EMBEDDING_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    model_id = f"sentence-transformers/{EMBEDDING_MODEL}"
+    model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True)
+    model.save_pretrained(out_dir)
+    AutoTokenizer.from_pretrained(model_id).save_pretrained(out_dir)
+
+    print("Quantizing weights to int8...")
+    quantize_dynamic(
+        str(out_dir / "model.onnx"),
+        str(out_dir / ONNX_MODEL_FILE),
+        weight_type=QuantType.QInt8,
+    )
+    print(f"Int8 model written to {out_dir / ONNX_MODEL_FILE}. Rebuild the index to use it.")
+
+if __name__ == "__main__":
+    main()
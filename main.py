@@ -4,7 +4,8 @@ logging.info("--- main.py loading ---")
 
 import asyncio
 import os
-from fastapi import FastAPI, HTTPException
+from itertools import islice
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
@@ -20,6 +21,7 @@ from scribby_pi.config import (
     LLM_MODEL,
     AGENT_NAME,
     NUM_RESEARCH_CHUNKS,
+    ONNX_EMBEDDING_DIR,
 )
 
 # --- Agent and App Setup ---
@@ -38,6 +40,7 @@ agent = ScribbyAgent(
     embedding_model_name=EMBEDDING_MODEL,
     llm_model=LLM_MODEL,
     num_research_chunks=NUM_RESEARCH_CHUNKS,
+    onnx_model_dir=Path(ONNX_EMBEDDING_DIR),
 )
 
 @app.on_event("startup")
@@ -45,6 +48,12 @@ async def startup_event():
     """On startup, load the agent's knowledge base and start its life cycle."""
     agent.start_life_cycle_task()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """On shutdown, halt the agent so buffered life-log records are written."""
+    agent.stop()
+    await agent.llm_client.close()
+
 # --- API Endpoints ---
 
 @app.get("/", response_class=HTMLResponse)
@@ -63,16 +72,13 @@ def get_status():
 
 
 @app.get("/notes")
-def get_notes():
-    """Returns a list of all generated notes."""
-    if not agent.notes_dir.exists():
-        return []
-    
-    notes = sorted(
-        [f.name for f in agent.notes_dir.glob("*.md")],
-        reverse=True
-    )
-    return notes
+async def get_notes(limit: int | None = Query(None, ge=1)):
+    """Returns generated note filenames, newest first, optionally only the latest `limit`.
+
+    Runs on the event loop, like the agent that adds to `notes_index`, so the
+    index cannot change while it is being read.
+    """
+    return list(islice(reversed(agent.notes_index), limit))
 
 
 @app.get("/notes/{note_filename}")
@@ -0,0 +1,7 @@
+import os
+
+# OpenMP/MKL read these once, when torch is first imported, so they are set
+# here before any submodule pulls torch in. Explicit user settings win.
+_CPU_COUNT = str(os.cpu_count() or 1)
+os.environ.setdefault("OMP_NUM_THREADS", _CPU_COUNT)
+os.environ.setdefault("MKL_NUM_THREADS", _CPU_COUNT)
@@ -1,11 +1,24 @@
 import asyncio
 import logging
+import logging.handlers
 import json
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
+from sortedcontainers import SortedList
 from .knowledge import KnowledgeBase
 from .llm import LLMClient
 
+# Life-log records are buffered and written to disk in groups of this size.
+LIFE_LOG_FLUSH_EVERY = 16
+# Number of past journal entries kept in memory; the full history is on disk.
+NOTE_HISTORY_SIZE = 32
+# Number of upcoming questions whose research is fetched ahead of time.
+PREFETCH_SIZE = 3
+
 
 class ScribbyAgent:
     """The main agent class for Scribby-Pi."""
@@ -20,6 +33,7 @@ class ScribbyAgent:
         embedding_model_name: str,
         llm_model: str,
         num_research_chunks: int,
+        onnx_model_dir: Path | None = None,
     ):
         self.name = name
         self.status = "Born"
@@ -31,28 +45,70 @@ class ScribbyAgent:
         self.notes_dir = notes_dir
         self.life_log_dir = life_log_dir
         self.num_research_chunks = num_research_chunks
+        # Note filenames embed their timestamp, so sorted order is chronological.
+        self.notes_index = SortedList(f.name for f in self.notes_dir.glob("*.md"))
 
         self._setup_life_logger()
 
         self.knowledge_base = KnowledgeBase(
             corpus_dir=corpus_dir,
             index_dir=index_dir,
-            embedding_model_name=embedding_model_name
+            embedding_model_name=embedding_model_name,
+            onnx_model_dir=onnx_model_dir
         )
         self.llm_client = LLMClient(model=llm_model)
-        self.note_history = []
-        self.open_questions = []
+        # Knowledge base calls embed on the CPU and would block the event loop.
+        # They run on one dedicated thread, which also keeps concurrent calls
+        # from oversubscribing torch's own thread pool.
+        self._kb_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="knowledge_base")
+        self.note_history_path = self.life_log_dir / "note_history.jsonl"
+        self.note_history = self._load_note_history()
+        self.open_questions = deque()
+        # Research results fetched during the sleep for upcoming questions.
+        self._prefetch: dict[str, list[str]] = {}
+        self._prefetch_task: asyncio.Task | None = None
 
     def _setup_life_logger(self):
-        """Sets up a dedicated logger for life cycle events."""
+        """Sets up a dedicated logger for life cycle events.
+
+        Records are handed to a queue and written by a listener thread, so
+        logging never blocks the event loop on disk I/O. The listener runs while
+        the life cycle does and flushes the buffer when it stops.
+        """
         self.life_log_dir.mkdir(parents=True, exist_ok=True)
         self.life_logger = logging.getLogger('life_log')
         self.life_logger.setLevel(logging.INFO)
         log_file = self.life_log_dir / f"life_log_{self.session_id}.jsonl"
-        handler = logging.FileHandler(log_file)
-        self.life_logger.addHandler(handler)
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+        self._life_log_buffer = logging.handlers.MemoryHandler(
+            capacity=LIFE_LOG_FLUSH_EVERY, flushLevel=logging.ERROR, target=file_handler
+        )
+        log_queue = queue.SimpleQueue()
+        self._life_log_listener = logging.handlers.QueueListener(log_queue, self._life_log_buffer)
+        self.life_logger.addHandler(logging.handlers.QueueHandler(log_queue))
         self.life_logger.propagate = False
 
+    def _load_note_history(self) -> deque:
+        """Restores the most recent journal entries from the on-disk note history."""
+        history = deque(maxlen=NOTE_HISTORY_SIZE)
+        if not self.note_history_path.exists():
+            return history
+        with open(self.note_history_path, 'r', encoding='utf-8') as f:
+            for line in deque(f, maxlen=NOTE_HISTORY_SIZE):
+                try:
+                    history.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A crash mid-write can leave a truncated last line.
+                    logging.warning("Skipping malformed line in note history.")
+        logging.info(f"Restored {len(history)} journal entries from {self.note_history_path}")
+        return history
+
+    def _append_note_history(self, record: dict):
+        """Appends one journal entry to the on-disk note history."""
+        with open(self.note_history_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+
     def _log_life_event(self, event_type: str, details: dict):
         """Logs a structured life cycle event to the life log."""
         log_entry = {
@@ -63,18 +119,27 @@ class ScribbyAgent:
         }
         self.life_logger.info(json.dumps(log_entry))
 
-    async def _planner(self):
-        """Plans the next research question."""
+    async def _run_in_kb_thread(self, func, *args):
+        """Runs a blocking knowledge base call on the knowledge base thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._kb_executor, func, *args)
+
+    async def _planner(self, tick_id: int):
+        """Plans the research question for tick `tick_id`.
+
+        The planner usually runs while the previous tick is finishing, so its
+        life-log events carry the tick they plan for.
+        """
         self.status = "Planning"
         logging.info("Planner: Thinking about what to research next...")
-        self._log_life_event('PLAN_START', {'open_questions': len(self.open_questions)})
+        self._log_life_event('PLAN_START', {'tick_id': tick_id, 'open_questions': len(self.open_questions)})
         
         if self.open_questions:
-            question = self.open_questions.pop(0)
+            question = self.open_questions.popleft()
             logging.info(f"Taking next question from open questions: '{question}'")
         elif not self.note_history:
             logging.info("First run. Generating question from a random knowledge base chunk.")
-            stimulus = self.knowledge_base.get_random_chunk()
+            stimulus = await self._run_in_kb_thread(self.knowledge_base.get_random_chunk)
             if stimulus:
                 question = await self.llm_client.generate_question_from_stimulus(stimulus)
             else:
@@ -83,7 +148,7 @@ class ScribbyAgent:
         else:
             question = await self.llm_client.generate_plan(self.note_history)
 
-        self._log_life_event('PLAN_COMPLETE', {'question': question})
+        self._log_life_event('PLAN_COMPLETE', {'tick_id': tick_id, 'question': question})
         return question
 
     async def _researcher(self, question: str):
@@ -92,7 +157,19 @@ class ScribbyAgent:
         logging.info(f"Researcher: Researching '{question}'...")
         self._log_life_event('RESEARCH_START', {'question': question})
 
-        results = self.knowledge_base.search(question, self.num_research_chunks)
+        if self._prefetch_task is not None:
+            # Prefetching holds the knowledge base thread, so a direct search
+            # would queue behind it anyway.
+            try:
+                await self._prefetch_task
+            except Exception as e:
+                logging.warning(f"Researcher: Prefetch failed, searching directly: {e}")
+            self._prefetch_task = None
+        results = self._prefetch.pop(question, None)
+        if results is None:
+            results = await self._run_in_kb_thread(self.knowledge_base.search, question, self.num_research_chunks)
+        else:
+            logging.info("Researcher: Using prefetched research.")
 
         if not results:
             notes = "No relevant information found in the knowledge base."
@@ -104,12 +181,15 @@ class ScribbyAgent:
         return notes
 
     async def _write_journal_entry(self, question: str, research_notes: str):
-        """Generates a journal entry, saves it, and updates agent memory."""
+        """Generates a journal entry and updates agent memory.
+
+        Returns the note path and content for `_save_note`, or None if the entry
+        could not be written.
+        """
         self.status = "Writing"
         logging.info("Writer: Reflecting and writing journal entry...")
         self._log_life_event('WRITE_START', {'question': question})
 
-        # 1. Generate each part of the journal entry sequentially.
         # 1. Generate each part of the journal entry sequentially.
         logging.info("Writer: Generating findings...")
         findings = await self.llm_client.generate_findings(question, research_notes)
@@ -127,7 +207,7 @@ class ScribbyAgent:
         if not isinstance(sparks_result, dict) or "questions" not in sparks_result or "raw_text" not in sparks_result:
             logging.error(f"LLM returned unexpected data for new_sparks: {sparks_result}")
             self._log_life_event('WRITE_FAILED', {'reason': 'Malformed sparks_result from LLM'})
-            return
+            return None
 
         new_sparks_clean = sparks_result["questions"]
         new_sparks_raw = sparks_result["raw_text"]
@@ -135,21 +215,22 @@ class ScribbyAgent:
         if not all([findings, thoughts]):
             logging.error("LLM failed to generate findings or thoughts. Skipping tick.")
             self._log_life_event('WRITE_FAILED', {'reason': 'Incomplete LLM response for findings/thoughts'})
-            return
+            return None
 
         # 2. Store structured data for the agent's own use.
-        self.note_history.append({
+        record = {
             'spark': question,
             'findings': findings,
             'thoughts': thoughts,
             'new_sparks': new_sparks_clean
-        })
+        }
+        self.note_history.append(record)
+        await asyncio.to_thread(self._append_note_history, record)
         self.open_questions.extend(new_sparks_clean)
         logging.info(f"Writer: Generated {len(new_sparks_clean)} new questions.")
 
-        # 3. Assemble the note for human readability and save it.
+        # 3. Assemble the note for human readability.
         timestamp = datetime.now()
-        self.notes_dir.mkdir(parents=True, exist_ok=True)
         note_path = self.notes_dir / f"note_{timestamp.strftime('%Y%m%d_%H%M%S')}.md"
         content = (
             f"# Journal Entry: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
@@ -158,31 +239,81 @@ class ScribbyAgent:
             f"## My Thoughts\n{thoughts}\n\n"
             f"## New Sparks\n{new_sparks_raw}"  # Use the raw text for the diary
         )
+        return note_path, content, len(new_sparks_clean)
+
+    async def _save_note(self, note_path: Path, content: str, new_questions: int):
+        """Writes a journal entry to disk without blocking the event loop."""
+        await asyncio.to_thread(self.notes_dir.mkdir, parents=True, exist_ok=True)
+        await asyncio.to_thread(note_path.write_text, content, encoding='utf-8')
+        if note_path.name not in self.notes_index:
+            self.notes_index.add(note_path.name)
 
-        with open(note_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
         logging.info(f"Writer: Note saved to {note_path}")
         self._log_life_event('WRITE_COMPLETE', {
             'note_path': str(note_path),
-            'new_questions_generated': len(new_sparks_clean)
+            'new_questions_generated': new_questions
         })
 
+    async def _prefetch_research(self, next_question_task: asyncio.Task):
+        """Fetches research for the next few questions in one batched search."""
+        try:
+            next_question = await next_question_task
+        except Exception:
+            # The life cycle loop awaits the same task and surfaces the error.
+            return
+        upcoming = list(dict.fromkeys([next_question, *islice(self.open_questions, PREFETCH_SIZE - 1)]))
+        self._prefetch = {q: r for q, r in self._prefetch.items() if q in upcoming}
+        pending = [q for q in upcoming if q not in self._prefetch]
+        if not pending:
+            return
+        results = await self._run_in_kb_thread(self.knowledge_base.search_many, pending, self.num_research_chunks)
+        self._prefetch.update(zip(pending, results))
+
+    def _mark_sleeping(self, _task: asyncio.Task):
+        """Done-callback for a background planner that outlives the tick."""
+        if self.status == "Planning":
+            self.status = "Sleeping"
+
     async def run_life_cycle(self):
-        """The main life cycle loop of the agent."""
+        """The main life cycle loop of the agent.
+
+        Ticks are double-buffered: once a journal entry is in memory, the next
+        tick's question is planned while the note is saved and the agent sleeps,
+        and research for the upcoming questions is prefetched during the sleep.
+        """
         tick_count = 0
-        while self.is_alive:
-            tick_count += 1
-            logging.info(f"--- New Life Cycle Tick #{tick_count} ---")
-            self._log_life_event('TICK_START', {'tick_id': tick_count})
-            
-            question = await self._planner()
-            research_notes = await self._researcher(question)
-            await self._write_journal_entry(question, research_notes)
-            
-            self._log_life_event('TICK_COMPLETE', {'tick_id': tick_count})
-            self.status = "Sleeping"
-            await asyncio.sleep(5)
+        next_question_task = None
+        try:
+            while self.is_alive:
+                tick_count += 1
+                logging.info(f"--- New Life Cycle Tick #{tick_count} ---")
+                self._log_life_event('TICK_START', {'tick_id': tick_count})
+
+                if next_question_task is not None:
+                    question = await next_question_task
+                else:
+                    question = await self._planner(tick_count)
+                research_notes = await self._researcher(question)
+                entry = await self._write_journal_entry(question, research_notes)
+
+                # Memory is up to date at this point, so planning can overlap the save.
+                next_question_task = asyncio.create_task(self._planner(tick_count + 1))
+                if entry is not None:
+                    await self._save_note(*entry)
+
+                self._log_life_event('TICK_COMPLETE', {'tick_id': tick_count})
+                if next_question_task.done():
+                    self.status = "Sleeping"
+                else:
+                    # Still "Planning"; report sleeping once the plan is ready.
+                    next_question_task.add_done_callback(self._mark_sleeping)
+                self._prefetch_task = asyncio.create_task(self._prefetch_research(next_question_task))
+                await asyncio.sleep(5)
+        finally:
+            for task in (next_question_task, self._prefetch_task):
+                if task is not None and not task.done():
+                    task.cancel()
+            self._prefetch_task = None
 
     def load_knowledge_base(self):
         """Builds the initial knowledge base index."""
@@ -194,6 +325,7 @@ class ScribbyAgent:
         """Creates and starts the life cycle asyncio task."""
         if not self.is_alive:
             self.is_alive = True
+            self._life_log_listener.start()
             self.life_cycle_task = asyncio.create_task(self.run_life_cycle())
             logging.info(f"Agent '{self.name}' has started its life cycle.")
 
@@ -204,5 +336,7 @@ class ScribbyAgent:
             if self.life_cycle_task:
                 self.life_cycle_task.cancel()
                 self.life_cycle_task = None
+            self._life_log_listener.stop()
+            self._life_log_buffer.flush()
             self.status = "Halted"
             logging.info(f"Agent '{self.name}' has been halted.")
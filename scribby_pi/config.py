@@ -8,6 +8,10 @@ CORPUS_DIR = DATA_DIR / "corpus"
 NOTES_DIR = DATA_DIR / "notes"
 INDEX_DIR = DATA_DIR / "index"
 LOG_DIR = DATA_DIR / "life_log"
+# Optional int8 ONNX export of the embedding model, created by export_onnx.py
+ONNX_EMBEDDING_DIR = DATA_DIR / "models" / "minilm-onnx-int8"
+# File written by export_onnx.py inside the ONNX model directory
+ONNX_MODEL_FILE = "model_int8.onnx"
 
 # Ensure directories exist
 for path in [DATA_DIR, CORPUS_DIR, NOTES_DIR, INDEX_DIR, LOG_DIR]:
@@ -1,129 +1,593 @@
 import logging
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
 from pathlib import Path
 from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
-from chromadb.utils import embedding_functions
-import logging
-from pathlib import Path
+import faiss
+import torch
+import numpy as np
 import random
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .config import ONNX_MODEL_FILE
 
-# Silence noisy chromadb logs
-logging.getLogger('chromadb').setLevel(logging.CRITICAL)
+# Markdown-style section headers, used to snap chunk boundaries and title chunks.
+_HEADER_PATTERN = re.compile(r'^#+\s.*$', re.MULTILINE)
+_HEADER_BYTES_PATTERN = re.compile(rb'^#+\s.*$', re.MULTILINE)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Use every core for intra-op GEMMs; encode() runs one batch at a time, so
+# little inter-op parallelism is needed.
+torch.set_num_threads(max(1, os.cpu_count() or 1))
+try:
+    torch.set_num_interop_threads(2)
+except RuntimeError:
+    # Can only be set before torch starts its inter-op pool.
+    pass
+
+# HNSW graph parameters: neighbours per node, and build/search beam widths.
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+# Map the index's flat vector storage read-only instead of copying it into
+# each process (needs faiss >= 1.11; plain IO_FLAG_MMAP only covers IVF lists).
+FAISS_MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+# Corpus file types, and the thread pool size used to read them.
+CORPUS_SUFFIXES = ('.txt', '.md')
+MAX_READ_WORKERS = 32
+# Files larger than this are memory-mapped and decoded chunk by chunk.
+MMAP_THRESHOLD_BYTES = 1024 * 1024
+
+# Number of distinct query embeddings kept in memory.
+QUERY_CACHE_SIZE = 1024
+
+# Token limit of all-MiniLM-L6-v2, matching its sentence-transformers config.
+ONNX_MAX_SEQ_LENGTH = 256
+
+
+def _replace_file(path: Path, write):
+    """Atomically replaces `path` with the bytes `write(f)` produces."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _char_boundary(data: mmap.mmap, pos: int) -> int:
+    """Moves `pos` forward past UTF-8 continuation bytes (0x80-0xBF) to the next character start."""
+    # A valid character has at most three continuation bytes; anything longer
+    # is left for the strict decode to reject.
+    for _ in range(3):
+        if pos >= len(data) or not 0x80 <= data[pos] <= 0xBF:
+            break
+        pos += 1
+    return pos
+
+
+def _decode_slice(data: mmap.mmap, start: int, end: int) -> str:
+    """Strictly decodes `data[start:end]` of a memory-mapped document.
+
+    Both edges are first moved to character boundaries, so byte offsets never
+    cut a multi-byte character; genuinely invalid UTF-8 still raises.
+    """
+    return data[_char_boundary(data, start):_char_boundary(data, end)].decode('utf-8')
+
+
+def _str_slice(data: str, start: int, end: int) -> str:
+    return data[start:end]
+
+
+class OnnxEmbedder:
+    """Int8-quantized ONNX Runtime embedder exported by export_onnx.py.
+
+    Implements the subset of the SentenceTransformer API used by KnowledgeBase:
+    mean pooling over token embeddings followed by L2 normalization.
+    """
+
+    def __init__(self, model_dir: Path):
+        # Optional dependencies, only needed when an ONNX export is present.
+        import onnxruntime as ort
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = os.cpu_count() or 1
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir,
+            file_name=ONNX_MODEL_FILE,
+            provider="CPUExecutionProvider",
+            session_options=session_options,
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = ONNX_MAX_SEQ_LENGTH
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.config.hidden_size
+
+    def embed_tokens(self, batch: dict[str, np.ndarray]) -> np.ndarray:
+        """Mean-pools token embeddings for an already tokenized, padded batch."""
+        hidden = self.model(**batch).last_hidden_state
+        mask = batch["attention_mask"][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts: list[str], batch_size: int = 64, normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        """Embeds texts in length-sorted batches, like SentenceTransformer.encode."""
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        pooled = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            batch = self.tokenizer(
+                [texts[i] for i in rows],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            pooled[rows] = self.embed_tokens(batch)
+        if normalize_embeddings:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+
+class TokenCache:
+    """On-disk cache of tokenized texts, so re-embedding can skip tokenization.
+
+    Entries are unpadded int32 `input_ids` arrays stored as
+    `<cache_dir>/<tokenizer fingerprint>/<sha256 of text>.npy`. A tokenizer with
+    a different vocabulary or settings gets its own directory, so a model
+    whose weights change but whose tokenizer does not still hits the cache.
+    """
+
+    def __init__(self, cache_dir: Path, tokenizer, max_length: int):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.cache_dir = cache_dir / self._fingerprint(tokenizer, max_length)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _fingerprint(tokenizer, max_length: int) -> str:
+        backend = getattr(tokenizer, 'backend_tokenizer', None)
+        spec = backend.to_str() if backend is not None else json.dumps(tokenizer.get_vocab(), sort_keys=True)
+        return hashlib.sha256(f"{max_length}\0{spec}".encode('utf-8')).hexdigest()[:16]
+
+    def _path(self, text: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(text.encode('utf-8')).hexdigest()}.npy"
+
+    def get_many(self, texts: list[str]) -> list[np.ndarray]:
+        """Returns the token IDs for each text, tokenizing and storing only cache misses."""
+        paths = [self._path(t) for t in texts]
+        token_ids = [np.load(p) if p.exists() else None for p in paths]
+        misses = [i for i, ids in enumerate(token_ids) if ids is None]
+        if misses:
+            # Stripped like SentenceTransformer's own tokenize(), so cached IDs
+            # match what encode() would produce.
+            encoded = self.tokenizer(
+                [texts[i].strip() for i in misses], truncation=True, max_length=self.max_length
+            )['input_ids']
+            for i, ids in zip(misses, encoded):
+                token_ids[i] = np.asarray(ids, dtype=np.int32)
+                _replace_file(paths[i], lambda f, ids=token_ids[i]: np.save(f, ids))
+        logging.info(f"Token cache: {len(texts) - len(misses)} hits, {len(misses)} misses.")
+        return token_ids
+
+    def prune(self, keep_texts: list[str]):
+        """Deletes cached entries for texts that are no longer in the corpus."""
+        keep = {self._path(t).name for t in keep_texts}
+        for path in self.cache_dir.glob("*.npy"):
+            if path.name not in keep:
+                path.unlink(missing_ok=True)
+
+
+# Embedding models are large, so each one is loaded once per process and
+# shared by every KnowledgeBase (and any thread) that asks for it.
+_MODEL_CACHE: dict[str, SentenceTransformer | OnnxEmbedder] = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+
+def get_cached_embedder(embedding_model_name: str, onnx_model_dir: Path | None = None) -> SentenceTransformer | OnnxEmbedder:
+    """Returns the shared embedder for a model, loading it on first use.
+
+    With `onnx_model_dir`, the int8 ONNX export in that directory is loaded
+    instead of the PyTorch model.
+    """
+    key = f"onnx:{onnx_model_dir.resolve()}" if onnx_model_dir is not None else embedding_model_name
+    with _MODEL_CACHE_LOCK:
+        if key not in _MODEL_CACHE:
+            if onnx_model_dir is not None:
+                _MODEL_CACHE[key] = OnnxEmbedder(onnx_model_dir)
+            else:
+                _MODEL_CACHE[key] = SentenceTransformer(embedding_model_name, device="cpu")
+        return _MODEL_CACHE[key]
+
+
 class KnowledgeBase:
-    """Manages the agent's knowledge base using ChromaDB."""
+    """Manages the agent's knowledge base using a FAISS HNSW index.
+
+    The index directory holds four files that are always written together:
+    `kb.faiss` (the HNSW graph), `vecs.npy` (the normalized float32 vectors,
+    row-aligned with the chunk store), `chunks.jsonl` (one
+    {id, document, metadata} record per vector) and `index_meta.json` (which
+    embedder produced the vectors).
 
-    def __init__(self, corpus_dir: Path, index_dir: Path, embedding_model_name: str):
+    If `onnx_model_dir` contains an int8 export from export_onnx.py, it is
+    used in place of the PyTorch SentenceTransformer model.
+    """
+
+    def __init__(self, corpus_dir: Path, index_dir: Path, embedding_model_name: str,
+                 onnx_model_dir: Path | None = None):
         self.corpus_dir = corpus_dir
         self.index_dir = index_dir
         self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.index_dir / "kb.faiss"
+        self.vectors_path = self.index_dir / "vecs.npy"
+        self.chunks_path = self.index_dir / "chunks.jsonl"
+        self.meta_path = self.index_dir / "index_meta.json"
 
-        self.client = chromadb.PersistentClient(
-            path=str(self.index_dir),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        
-        embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model_name, device="cpu"
-        )
-        
-        self.collection = self.client.get_or_create_collection(
-            name="scribby_corpus",
-            embedding_function=embedding_func
-        )
-        logging.info(f"ChromaDB collection '{self.collection.name}' loaded/created.")
+        if onnx_model_dir is not None and (onnx_model_dir / ONNX_MODEL_FILE).exists():
+            logging.info(f"Using int8 ONNX embedder from {onnx_model_dir}.")
+            self.model = get_cached_embedder(embedding_model_name, onnx_model_dir)
+            self.embedder_id = f"onnx-int8:{embedding_model_name}"
+        else:
+            self.model = get_cached_embedder(embedding_model_name)
+            self.embedder_id = embedding_model_name
+        self.dim = self.model.get_sentence_embedding_dimension()
+        # Tick questions recur often, so query embeddings are memoized per instance.
+        self._query_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._query_hits = 0
+        self._query_misses = 0
+
+        self.index = None
+        self.vectors = np.empty((0, self.dim), dtype=np.float32)
+        self.chunks: list[str] = []
+        self.metadatas: list[dict] = []
+        self.ids: list[str] = []
+        self._load_index()
+
+    def _load_index(self):
+        """Loads a previously built index from disk, if there is one."""
+        paths = (self.index_path, self.vectors_path, self.chunks_path, self.meta_path)
+        if not all(p.exists() for p in paths):
+            logging.info("No existing index found.")
+            return
+
+        meta = json.loads(self.meta_path.read_text(encoding='utf-8'))
+        if meta.get('embedder') != self.embedder_id:
+            logging.warning(f"Index was built with '{meta.get('embedder')}', not '{self.embedder_id}'. Ignoring it.")
+            return
+
+        with open(self.chunks_path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        # The vectors and the index's flat storage are mapped read-only, so
+        # processes sharing an index directory share their page-cache pages;
+        # only the HNSW neighbour graph is loaded into each process.
+        vectors = np.load(self.vectors_path, mmap_mode='r')
+        index = faiss.read_index(str(self.index_path), FAISS_MMAP_FLAGS)
+        if not (len(records) == len(vectors) == index.ntotal) or vectors.shape[1] != self.dim:
+            logging.warning("Index files are inconsistent. Ignoring them.")
+            return
+
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        self.index = index
+        self.vectors = vectors
+        self.ids = [r['id'] for r in records]
+        self.chunks = [r['document'] for r in records]
+        self.metadatas = [r['metadata'] for r in records]
+        logging.info(f"FAISS index loaded with {index.ntotal} chunks.")
+
+    def _save_index(self):
+        """Writes the index, vectors and chunk store to the index directory.
+
+        Each file is written to a temporary path and renamed into place, so
+        processes that have the old files mapped keep a valid view of them.
+        """
+        def write_chunks(f):
+            for chunk_id, document, metadata in zip(self.ids, self.chunks, self.metadatas):
+                f.write(json.dumps({'id': chunk_id, 'document': document, 'metadata': metadata}).encode('utf-8') + b"\n")
+
+        tmp_index_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        faiss.write_index(self.index, str(tmp_index_path))
+        os.replace(tmp_index_path, self.index_path)
+        _replace_file(self.vectors_path, lambda f: np.save(f, self.vectors))
+        _replace_file(self.chunks_path, write_chunks)
+        _replace_file(self.meta_path, lambda f: f.write(json.dumps({'embedder': self.embedder_id}).encode('utf-8')))
 
     def _load_documents(self):
         """Loads all .txt and .md documents from the corpus directory."""
         logging.info(f"Loading documents from {self.corpus_dir}...")
-        docs = []
-        for file_path in self.corpus_dir.glob("**/*"):
-            if file_path.is_file() and file_path.suffix in ['.txt', '.md']:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        docs.append({'path': str(file_path.relative_to(self.corpus_dir)), 'content': f.read()})
-                except Exception as e:
-                    logging.error(f"Failed to read {file_path}: {e}")
+        paths = sorted(p for p in self.corpus_dir.rglob("*") if p.suffix in CORPUS_SUFFIXES and p.is_file())
+        if not paths:
+            logging.info("Loaded 0 documents.")
+            return []
+        # Reads are I/O-bound, so a thread pool overlaps them.
+        with ThreadPoolExecutor(max_workers=min(MAX_READ_WORKERS, len(paths))) as executor:
+            docs = [doc for doc in executor.map(self._read_document, paths) if doc is not None]
         logging.info(f"Loaded {len(docs)} documents.")
         return docs
 
+    def _read_document(self, file_path: Path) -> dict | None:
+        """Reads one corpus file, returning None if it cannot be read.
+
+        Large files are returned as a read-only mmap instead of a str, so the
+        whole file is never copied into Python memory; `_close_documents`
+        releases them.
+        """
+        try:
+            if file_path.stat().st_size > MMAP_THRESHOLD_BYTES:
+                with open(file_path, 'rb') as f:
+                    content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                content = file_path.read_text(encoding='utf-8')
+        except Exception as e:
+            logging.error(f"Failed to read {file_path}: {e}")
+            return None
+        return {'path': str(file_path.relative_to(self.corpus_dir)), 'content': content}
+
+    @staticmethod
+    def _close_documents(docs: list[dict]):
+        """Unmaps any memory-mapped document contents."""
+        for doc in docs:
+            if isinstance(doc['content'], mmap.mmap):
+                doc['content'].close()
+
     def _chunk_documents(self, docs: list[dict], chunk_size=512, overlap=50):
-        """Splits documents into smaller chunks with metadata and IDs."""
+        """Splits documents into smaller chunks with metadata and IDs.
+
+        Chunk starts are snapped to a nearby section header when one falls within
+        the overlap window, and each chunk is titled after its enclosing section
+        (or the document name when the document has no headers). Memory-mapped
+        documents are chunked by byte offset and decoded one chunk at a time.
+        """
         logging.info("Chunking documents...")
         chunks, metadatas, ids = [], [], []
-        chunk_count = 0
-        for doc_idx, doc in enumerate(docs):
+        for doc in docs:
             content = doc['content']
-            for i in range(0, len(content), chunk_size - overlap):
-                chunk_text = content[i:i + chunk_size]
-                chunks.append(chunk_text)
-                metadatas.append({'source': doc['path']})
-                ids.append(f"doc{doc_idx}_chunk{chunk_count}")
-                chunk_count += 1
+            if isinstance(content, mmap.mmap):
+                header_pattern, text_slice = _HEADER_BYTES_PATTERN, _decode_slice
+            else:
+                header_pattern, text_slice = _HEADER_PATTERN, _str_slice
+            try:
+                headers = [
+                    (m.start(), text_slice(content, m.start(), m.end()).lstrip('#').strip())
+                    for m in header_pattern.finditer(content)
+                ]
+                header_starts = [start for start, _ in headers]
+                starts = self._chunk_starts(len(content), header_starts, chunk_size, overlap)
+                doc_chunks = [text_slice(content, i, i + chunk_size) for i in starts]
+            except UnicodeDecodeError as e:
+                # Mapped files are decoded lazily, so this is where a
+                # mis-encoded large file surfaces; skip it like a small one.
+                logging.error(f"Failed to read {doc['path']}: {e}")
+                continue
+
+            default_title = Path(doc['path']).stem.lstrip('0123456789_').replace('_', ' ')
+            titles = [self._title_at(i, headers, header_starts, default_title) for i in starts]
+            doc_metadatas = [{'source': doc['path'], 'title': title} for title in titles]
+            chunks.extend(doc_chunks)
+            metadatas.extend(doc_metadatas)
+            ids.extend(self._chunk_id(c, m) for c, m in zip(doc_chunks, doc_metadatas))
         logging.info(f"Created {len(chunks)} chunks.")
         return chunks, metadatas, ids
 
+    @staticmethod
+    def _chunk_id(chunk: str, metadata: dict) -> str:
+        """Content-addressed chunk ID, stable across rebuilds while the chunk is unchanged."""
+        key = f"{metadata['source']}\0{KnowledgeBase._retrieval_text(chunk, metadata)}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _retrieval_text(chunk: str, metadata: dict) -> str:
+        """Builds the title-weighted string that is embedded for a chunk: title || title || text."""
+        title = metadata.get('title', '')
+        return f"{title}\n{title}\n{chunk}" if title else chunk
+
+    def _embed(self, texts: list[str], batch_size: int = 64) -> np.ndarray:
+        """Encodes texts into L2-normalized float32 embeddings in batches."""
+        # encode() already groups inputs by length internally, so batches
+        # carry little padding without sorting here.
+        vecs = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=len(texts) > batch_size,
+        )
+        return vecs.astype(np.float32, copy=False)
+
+    def _embed_token_ids(self, token_ids: list[np.ndarray], batch_size: int = 64) -> np.ndarray:
+        """Embeds pre-tokenized texts in length-sorted, padded batches.
+
+        Runs the model's own module stack (so its configured pooling applies)
+        on the cached token IDs, then L2-normalizes the result.
+        """
+        tokenizer = self.model.tokenizer
+        pad_id = tokenizer.pad_token_id or 0
+        order = np.argsort([-len(ids) for ids in token_ids], kind="stable")
+        vecs = np.empty((len(token_ids), self.dim), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            width = max(len(token_ids[i]) for i in rows)
+            input_ids = np.full((len(rows), width), pad_id, dtype=np.int64)
+            attention_mask = np.zeros_like(input_ids)
+            for n, i in enumerate(rows):
+                input_ids[n, :len(token_ids[i])] = token_ids[i]
+                attention_mask[n, :len(token_ids[i])] = 1
+            batch = {'input_ids': input_ids, 'attention_mask': attention_mask}
+            if 'token_type_ids' in tokenizer.model_input_names:
+                batch['token_type_ids'] = np.zeros_like(input_ids)
+            vecs[rows] = self._forward_tokens(batch)
+        vecs /= np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+        return vecs
+
+    def _forward_tokens(self, batch: dict[str, np.ndarray]) -> np.ndarray:
+        """Returns sentence embeddings for one tokenized batch."""
+        if isinstance(self.model, OnnxEmbedder):
+            return self.model.embed_tokens(batch)
+        with torch.inference_mode():
+            features = {k: torch.from_numpy(v).to(self.model.device) for k, v in batch.items()}
+            return self.model(features)['sentence_embedding'].float().cpu().numpy()
+
+    def _embed_queries(self, queries: list[str]) -> np.ndarray:
+        """Embeds queries through the LRU cache, batch-encoding only the misses."""
+        vecs = np.empty((len(queries), self.dim), dtype=np.float32)
+        misses: dict[str, list[int]] = {}
+        for row, query in enumerate(queries):
+            cached = self._query_cache.get(query)
+            if cached is None:
+                misses.setdefault(query, []).append(row)
+            else:
+                self._query_cache.move_to_end(query)
+                vecs[row] = cached
+        self._query_hits += len(queries) - len(misses)
+        self._query_misses += len(misses)
+
+        if misses:
+            for query, vec in zip(misses, self._embed(list(misses))):
+                vecs[misses[query]] = vec
+                self._query_cache[query] = vec
+            while len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return vecs
+
+    def embed_stats(self) -> dict:
+        """Returns hit/miss statistics for the query embedding cache."""
+        return {
+            'hits': self._query_hits,
+            'misses': self._query_misses,
+            'size': len(self._query_cache),
+            'maxsize': QUERY_CACHE_SIZE,
+        }
+
+    @classmethod
+    def _chunk_starts(cls, length: int, header_starts: list[int], chunk_size: int, overlap: int) -> list[int]:
+        """Returns chunk start offsets that leave no text outside every chunk.
+
+        Each start is derived from the previous one, so snapping to a header can
+        never open a gap: the next start is at most `chunk_size` past the
+        previous one and always moves forward.
+        """
+        step = chunk_size - overlap
+        starts = []
+        start = 0
+        while start < length:
+            starts.append(start)
+            next_start = min(cls._snap_to_header(start + step, header_starts, overlap), start + chunk_size)
+            start = next_start if next_start > start else start + step
+        return starts
+
+    @staticmethod
+    def _snap_to_header(start: int, header_starts: list[int], window: int) -> int:
+        """Moves a chunk start to the closest header within `window` characters."""
+        if not header_starts:
+            return start
+        pos = bisect.bisect_left(header_starts, start)
+        candidates = header_starts[max(pos - 1, 0):pos + 1]
+        nearest = min(candidates, key=lambda h: abs(h - start))
+        return nearest if abs(nearest - start) <= window else start
+
+    @staticmethod
+    def _title_at(start: int, headers: list[tuple[int, str]], header_starts: list[int], default: str) -> str:
+        """Returns the title of the section that contains `start`."""
+        pos = bisect.bisect_right(header_starts, start)
+        return headers[pos - 1][1] if pos else default
+
     def build_index(self):
-        """Builds or updates the ChromaDB index from the documents in the corpus."""
+        """Builds or updates the FAISS index from the documents in the corpus."""
         logging.info("Checking for documents to add to the index...")
         docs = self._load_documents()
         if not docs:
             logging.warning("No documents found in corpus. Index will not be updated.")
             return
 
-        chunks, metadatas, ids = self._chunk_documents(docs)
-        
-        # Simple check to avoid re-indexing identical content.
-        # A more robust solution would involve checksums or versioning.
-        if self.collection.count() == len(ids):
-            logging.info("Index appears to be up-to-date. Skipping build.")
+        try:
+            chunks, metadatas, ids = self._chunk_documents(docs)
+        finally:
+            self._close_documents(docs)
+
+        # Chunk IDs are content hashes, so only new or changed chunks need
+        # embedding; vectors of unchanged chunks are reused from the old index.
+        unique = {}
+        for i, chunk_id in enumerate(ids):
+            unique.setdefault(chunk_id, i)
+        order = list(unique.values())
+        existing = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        old_rows = [n for n, i in enumerate(order) if ids[i] in existing]
+        new_rows = [n for n, i in enumerate(order) if ids[i] not in existing]
+        num_stale = len(existing.keys() - unique.keys())
+
+        if not new_rows and not num_stale and self.index is not None:
+            logging.info("Index is up-to-date. Skipping build.")
             return
 
-        logging.info(f"Building index with {len(chunks)} chunks...")
-        # Clear old collection to rebuild from scratch
-        if self.collection.count() > 0:
-            logging.info("Clearing existing collection before rebuild.")
-            self.client.delete_collection(name=self.collection.name)
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection.name,
-                embedding_function=self.collection._embedding_function
-            )
+        if num_stale:
+            logging.info(f"Removing {num_stale} stale chunks from the index.")
 
-        # ChromaDB handles batching internally, but for very large datasets,
-        # manual batching might be necessary.
-        self.collection.add(
-            documents=chunks,
-            metadatas=metadatas,
-            ids=ids
-        )
-        logging.info("Index build complete.")
+        vectors = np.empty((len(order), self.dim), dtype=np.float32)
+        vectors[old_rows] = self.vectors[[existing[ids[order[n]]] for n in old_rows]]
+        if new_rows:
+            logging.info(f"Embedding {len(new_rows)} new chunks ({len(old_rows)} unchanged)...")
+            token_cache = TokenCache(self.index_dir / "tokens", self.model.tokenizer, self.model.max_seq_length)
+            new_texts = [self._retrieval_text(chunks[order[n]], metadatas[order[n]]) for n in new_rows]
+            vectors[new_rows] = self._embed_token_ids(token_cache.get_many(new_texts))
+            token_cache.prune([self._retrieval_text(chunks[i], metadatas[i]) for i in order])
+
+        # HNSW does not support removal, so the graph is rebuilt from the
+        # stored vectors; this is cheap next to embedding.
+        index = faiss.IndexHNSWFlat(self.dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        index.add(vectors)
+
+        self.index = index
+        self.vectors = vectors
+        self.ids = [ids[i] for i in order]
+        self.chunks = [chunks[i] for i in order]
+        self.metadatas = [metadatas[i] for i in order]
+        self._save_index()
+        logging.info(f"Index build complete with {index.ntotal} chunks.")
 
     def search(self, query: str, k: int = 3):
         """Searches the index for the most relevant document chunks."""
-        if self.collection.count() == 0:
+        if self.index is None or self.index.ntotal == 0:
             logging.error("Index is empty. Cannot perform search.")
             return []
-            
+
         logging.info(f"Searching for query: '{query}'")
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=k
-        )
-        
-        documents = results.get('documents', [[]])[0]
+        query_vec = self._embed_queries([query])
+        _, indices = self.index.search(query_vec, min(k, self.index.ntotal))
+
+        # FAISS pads with -1 when fewer than k neighbours are reachable.
+        documents = [self.chunks[i] for i in indices[0] if i >= 0]
         logging.info(f"Found {len(documents)} relevant chunks.")
         return documents
 
+    def search_many(self, queries: list[str], k: int = 3) -> list[list[str]]:
+        """Searches for several queries with one FAISS search.
+
+        Cached query embeddings are reused; only the misses are encoded, in one batch.
+        """
+        if self.index is None or self.index.ntotal == 0:
+            logging.error("Index is empty. Cannot perform search.")
+            return [[] for _ in queries]
+        if not queries:
+            return []
+
+        logging.info(f"Searching for {len(queries)} queries in one batch.")
+        _, indices = self.index.search(self._embed_queries(queries), min(k, self.index.ntotal))
+        return [[self.chunks[i] for i in row if i >= 0] for row in indices]
+
     def get_random_chunk(self) -> str | None:
-        """Returns a random chunk from the knowledge base."""
-        count = self.collection.count()
-        if count == 0:
+        """Returns a random chunk from the knowledge base.
+
+        Chunks are held in memory alongside the index, so this never touches disk.
+        """
+        if not self.chunks:
             logging.warning("No document chunks loaded. Cannot get a random chunk.")
             return None
-        
-        random_offset = random.randint(0, count - 1)
-        result = self.collection.get(limit=1, offset=random_offset)
-        return result['documents'][0] if result['documents'] else None
+        return random.choice(self.chunks)
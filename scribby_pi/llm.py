@@ -1,39 +1,102 @@
+import httpx
 import ollama
 import logging
 import re
+from collections.abc import Sequence
+
+# Lines that look like questions, optionally bulleted.
+_Q_PATTERN = re.compile(r"^\s*[-*]?\s*(.+?\?)")
+# Conversational filler that the model sometimes phrases as a question.
+_FILLER_PATTERN = re.compile(r"^(based on|here is)", re.IGNORECASE)
+
+# One pooled HTTP client is shared by every request to Ollama; local
+# generations can take minutes, so the timeout is generous.
+_HTTP_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=8)
+_HTTP_TIMEOUT = httpx.Timeout(120.0)
+
+_PLAN_SYS_PROMPT = (
+    "You are Scribby, a curious AI writing in a private journal. Your task is to generate a single, compelling research question to explore next, based on your previous journal entries. "
+    "Respond with ONLY the question."
+)
+
+_FINDINGS_SYS_PROMPT = (
+    "You are Scribby, a curious AI writing in a private journal. Your task is to summarize the provided research notes to answer your original question. "
+    "Respond with ONLY the summary."
+)
+
+_THOUGHTS_SYS_PROMPT = (
+    "You are Scribby, a curious AI writing in a private journal. Your task is to reflect on your findings. What surprised you? What new ideas does this spark? "
+    "Respond with ONLY your reflection."
+)
+
+_STIMULUS_SYS_PROMPT = (
+    "You are Scribby, a curious AI writing in a private journal. Your task is to read the provided text and generate a single, compelling research question it inspires. "
+    "Respond with ONLY the question."
+)
+
+_SPARK_SYS_PROMPT = (
+    "You are Scribby, a curious AI writing in a private journal. Reflect on your recent thoughts and generate a short, reflective monologue. "
+    "End your monologue with a list of 3 new, specific research questions that your reflection inspired. Each question must start with '- '."
+)
+
 
 class LLMClient:
     """A client for interacting with the Ollama service."""
 
     def __init__(self, model: str):
         self.model = model
-        self.client = ollama.AsyncClient()
+        # Extra keyword arguments are passed through to the underlying httpx.AsyncClient.
+        self.client = ollama.AsyncClient(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+
+    async def close(self):
+        """Closes the pooled HTTP connections to Ollama."""
+        # ollama.AsyncClient has no public close; its httpx client is `_client`.
+        await self.client._client.aclose()
+
+    async def _chat(self, system_prompt: str, user_prompt: str, on_line=None) -> str:
+        """Streams a chat completion and returns the full response text.
+
+        Streaming keeps the awaits short, so cancelling the calling task (e.g. on
+        `agent.stop()`) interrupts an in-flight generation. If `on_line` is given,
+        it is called with each complete line as soon as it has arrived.
+        """
+        parts = []
+        pending = ""
+        stream = await self.client.chat(
+            model=self.model,
+            messages=[
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_prompt},
+            ],
+            stream=True,
+        )
+        async for part in stream:
+            piece = part['message']['content']
+            parts.append(piece)
+            if on_line is not None:
+                pending += piece
+                *lines, pending = pending.split('\n')
+                for line in lines:
+                    on_line(line)
+        if on_line is not None and pending:
+            on_line(pending)
+        return "".join(parts)
 
-    async def generate_plan(self, previous_notes: list[str] = None) -> str:
+    async def generate_plan(self, previous_notes: Sequence[dict] = None) -> str:
         """Generates a new research question based on previous notes."""
         logging.info("LLM: Generating a new plan...")
-        system_prompt = (
-            "You are Scribby, a curious AI writing in a private journal. Your task is to generate a single, compelling research question to explore next, based on your previous journal entries. "
-            "Respond with ONLY the question."
-        )
         
         user_prompt = "My recent journal entries:\n"
         if previous_notes:
-            for note in previous_notes[-3:]:
+            for note in list(previous_notes)[-3:]:
                 user_prompt += f"- Spark: {note['spark']}\n"
                 user_prompt += f"- Thoughts: {note['thoughts']}\n"
         else:
             user_prompt = "This is my very first entry. I have no previous thoughts."
         
-        response = await self.client.chat(
-            model=self.model,
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt},
-            ],
-        )
+        content = await self._chat(_PLAN_SYS_PROMPT, user_prompt)
         # Aggressively clean the response to ensure only the question is returned.
-        content = response['message']['content'].strip()
+        content = content.strip()
         # Split by newlines, filter out empty lines, and take the last one.
         lines = [line.strip().lstrip('- ').strip() for line in content.split('\n') if line.strip()]
         # Fallback to a default question if the LLM returns nothing.
@@ -42,86 +105,47 @@ class LLMClient:
     async def generate_findings(self, question: str, research_notes: str) -> str:
         """Synthesizes research notes into a narrative summary."""
         logging.info("LLM: Synthesizing findings...")
-        system_prompt = (
-            "You are Scribby, a curious AI writing in a private journal. Your task is to summarize the provided research notes to answer your original question. "
-            "Respond with ONLY the summary."
-        )
         user_prompt = f"My question: {question}\n\nRelevant notes I found:\n{research_notes}"
         
-        response = await self.client.chat(
-            model=self.model,
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt},
-            ],
-        )
-        return response['message']['content'].strip()
+        content = await self._chat(_FINDINGS_SYS_PROMPT, user_prompt)
+        return content.strip()
 
     async def generate_thoughts(self, question: str, findings: str) -> str:
         """Generates a personal reflection on the research findings."""
         logging.info("LLM: Generating personal thoughts...")
-        system_prompt = (
-            "You are Scribby, a curious AI writing in a private journal. Your task is to reflect on your findings. What surprised you? What new ideas does this spark? "
-            "Respond with ONLY your reflection."
-        )
         user_prompt = f"My question: {question}\n\nMy summary of findings:\n{findings}"
         
-        response = await self.client.chat(
-            model=self.model,
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt},
-            ],
-        )
-        return response['message']['content'].strip()
+        content = await self._chat(_THOUGHTS_SYS_PROMPT, user_prompt)
+        return content.strip()
 
     async def generate_question_from_stimulus(self, stimulus: str) -> str:
         """Generates a single research question based on a stimulus text."""
         logging.info("LLM: Generating question from stimulus...")
-        system_prompt = (
-            "You are Scribby, a curious AI writing in a private journal. Your task is to read the provided text and generate a single, compelling research question it inspires. "
-            "Respond with ONLY the question."
-        )
         user_prompt = stimulus
 
-        response = await self.client.chat(
-            model=self.model,
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt},
-            ],
-        )
-        question = response['message']['content'].strip().replace('"', '')
+        content = await self._chat(_STIMULUS_SYS_PROMPT, user_prompt)
+        question = content.strip().replace('"', '')
         logging.info(f"Generated question from stimulus: '{question}'")
         return question
 
     async def generate_new_sparks(self, question: str, thoughts: str) -> dict:
         """Generates new sparks of curiosity as a raw text block and a clean list of questions."""
         logging.info("LLM: Generating new sparks of curiosity...")
-        system_prompt = (
-            "You are Scribby, a curious AI writing in a private journal. Reflect on your recent thoughts and generate a short, reflective monologue. "
-            "End your monologue with a list of 3 new, specific research questions that your reflection inspired. Each question must start with '- '."
-        )
         user_prompt = f"My question: {question}\n\nMy thoughts:\n{thoughts}"
-        
-        response = await self.client.chat(
-            model=self.model,
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt},
-            ],
-        )
-        
-        content = response['message']['content'].strip()
-        # Aggressively find and clean the questions.
+
+        # Aggressively find and clean the questions, line by line as they stream in.
         questions = []
-        # Use regex to find lines that look like questions.
-        potential_questions = re.findall(r"^\s*[-*]?\s*(.+?\?)", content, re.MULTILINE)
-        for q in potential_questions:
+
+        def collect_question(line: str):
+            # Use regex to find lines that look like questions.
+            match = _Q_PATTERN.match(line)
+            if not match:
+                return
             # Clean up any remaining artifacts.
-            cleaned_q = q.strip().replace('"', '')
+            cleaned_q = match.group(1).strip().replace('"', '')
             # Avoid adding conversational filler.
-            if not cleaned_q.lower().startswith(("based on", "here is")):
+            if not _FILLER_PATTERN.match(cleaned_q):
                 questions.append(cleaned_q)
 
-        return {"raw_text": content, "questions": questions}
+        content = await self._chat(_SPARK_SYS_PROMPT, user_prompt, on_line=collect_question)
+        return {"raw_text": content.strip(), "questions": questions}
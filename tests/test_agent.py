@@ -1,6 +1,9 @@
 import asyncio
+import json
+import logging
 import pytest
 import os
+from collections import deque
 from scribby_pi.agent import ScribbyAgent
 from scribby_pi import config
 
@@ -46,3 +49,50 @@ async def test_agent_full_life_cycle_tick():
     #     new_note_path = config.NOTES_DIR / new_notes.pop()
     #     if os.path.exists(new_note_path):
     #         os.remove(new_note_path)
+
+
+class _PlanOnlyLLM:
+    def __init__(self):
+        self.plan_calls = []
+
+    async def generate_plan(self, previous_notes):
+        self.plan_calls.append(list(previous_notes))
+        return "What did I miss?"
+
+    async def generate_question_from_stimulus(self, stimulus):
+        raise AssertionError("a restored agent should not start from a random chunk")
+
+
+class _NoRandomChunkKB:
+    def get_random_chunk(self):
+        raise AssertionError("a restored agent should not start from a random chunk")
+
+
+@pytest.mark.asyncio
+async def test_restarted_agent_restores_note_history(tmp_path):
+    """Tests that note history survives a restart and skips a truncated last line."""
+    records = [
+        {'spark': "Why do cats purr?", 'thoughts': "Vibration.", 'new_questions': []},
+        {'spark': "How do bees see?", 'thoughts': "Ultraviolet.", 'new_questions': ["Why UV?"]},
+    ]
+    history_path = tmp_path / "note_history.jsonl"
+    with open(history_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.write('{"spark": "Where do')  # crashed mid-write
+
+    # Only the state the planner touches; skips loading the models.
+    agent = ScribbyAgent.__new__(ScribbyAgent)
+    agent.session_id = "test"
+    agent.life_logger = logging.getLogger("test_life_log")
+    agent.note_history_path = history_path
+    agent.note_history = agent._load_note_history()
+    agent.open_questions = deque()
+    agent.llm_client = _PlanOnlyLLM()
+    agent.knowledge_base = _NoRandomChunkKB()
+
+    assert list(agent.note_history) == records
+
+    question = await agent._planner(1)
+    assert question == "What did I miss?"
+    assert agent.llm_client.plan_calls == [records]
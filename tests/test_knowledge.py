@@ -0,0 +1,122 @@
+import re
+
+import numpy as np
+
+from scribby_pi import knowledge
+from scribby_pi.knowledge import KnowledgeBase
+
+
+def _empty_kb() -> KnowledgeBase:
+    # Chunking and random picks do not touch the index, so skip loading the model.
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.chunks = []
+    return kb
+
+
+def _chunk(content: str, path: str = "01_sample_doc.md", **kwargs):
+    return _empty_kb()._chunk_documents([{'path': path, 'content': content}], **kwargs)
+
+
+def test_chunks_cover_document_with_overlap():
+    content = "abcdefghij" * 10
+    chunks, metadatas, ids = _chunk(content, chunk_size=30, overlap=10)
+
+    assert chunks[0] == content[:30]
+    assert chunks[1] == content[20:50]
+    assert len(chunks) == len(metadatas) == len(ids) == 5
+    assert all(m['title'] == "sample doc" for m in metadatas)
+
+
+def test_chunk_starts_snap_to_nearby_headers():
+    content = "x" * 95 + "\n# Heading\n" + "y" * 200
+    chunks, metadatas, _ = _chunk(content, chunk_size=100, overlap=10)
+
+    assert chunks[1].startswith("# Heading")
+    assert metadatas[0]['title'] == "sample doc"
+    assert metadatas[1]['title'] == "Heading"
+
+
+
+def _assert_chunks_cover(content: str, chunk_size: int, overlap: int):
+    kb = _empty_kb()
+    header_starts = [m.start() for m in re.finditer(r'^#', content, re.MULTILINE)]
+    starts = kb._chunk_starts(len(content), header_starts, chunk_size, overlap)
+    covered = [False] * len(content)
+    for start in starts:
+        covered[start:start + chunk_size] = [True] * len(covered[start:start + chunk_size])
+    assert all(covered), f"uncovered offsets: {[i for i, c in enumerate(covered) if not c][:5]}"
+    assert starts == sorted(set(starts))
+
+
+def test_chunks_cover_document_when_headers_surround_grid_points():
+    # Headers just before one step boundary and just after the next one.
+    content = "a" * 420 + "\n# First\n" + "b" * 544 + "\n# Second\n" + "c" * 1500
+    assert content.index("# First") == 421
+    assert content.index("# Second") == 974
+    _assert_chunks_cover(content, chunk_size=512, overlap=50)
+
+    chunks, _, _ = _chunk(content, chunk_size=512, overlap=50)
+    assert any(c.startswith("# First") for c in chunks)
+
+
+def test_chunks_cover_document_with_dense_headers():
+    content = "".join(f"# H{i}\n" + "x" * (17 * i % 90) + "\n" for i in range(200))
+    _assert_chunks_cover(content, chunk_size=100, overlap=20)
+
+def test_chunk_ids_depend_only_on_content():
+    _, _, ids = _chunk("same text " * 100, chunk_size=100, overlap=10)
+    _, _, ids_again = _chunk("same text " * 100, chunk_size=100, overlap=10)
+    _, _, ids_edited = _chunk("same text " * 99 + "new text! ", chunk_size=100, overlap=10)
+
+    assert ids == ids_again
+    assert ids_edited[:-2] == ids[:-2]
+    assert ids_edited[-1] != ids[-1]
+
+
+def test_random_chunk_comes_from_in_memory_chunks():
+    kb = _empty_kb()
+    assert kb.get_random_chunk() is None
+
+    kb.chunks = ["first", "second", "third"]
+    assert kb.get_random_chunk() in kb.chunks
+
+
+def test_memory_mapped_documents_decode_strictly(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge, "MMAP_THRESHOLD_BYTES", 100)
+    text = "héllo wörld 日本語 " * 100 + "\n# Ünï\n" + "€uro " * 100
+    (tmp_path / "good.md").write_text(text, encoding='utf-8')
+    raw = text.encode('utf-8')
+    (tmp_path / "bad.md").write_bytes(raw[:500] + b"\xff" + raw[500:])
+
+    kb = _empty_kb()
+    kb.corpus_dir = tmp_path
+    docs = kb._load_documents()
+    try:
+        chunks, metadatas, _ = kb._chunk_documents(docs, chunk_size=97, overlap=13)
+    finally:
+        kb._close_documents(docs)
+
+    # Byte offsets that cut a character are moved, never decoded lossily.
+    assert {m['source'] for m in metadatas} == {"good.md"}
+    assert all("\ufffd" not in c for c in chunks)
+    assert "Ünï" in {m['title'] for m in metadatas}
+    assert set("".join(chunks)) == set(text)
+
+
+def test_query_cache_batch_encodes_only_misses(monkeypatch):
+    kb = _empty_kb()
+    kb.dim = 2
+    kb._query_cache, kb._query_hits, kb._query_misses = knowledge.OrderedDict(), 0, 0
+    encoded = []
+
+    def fake_embed(texts):
+        encoded.append(list(texts))
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+    monkeypatch.setattr(kb, "_embed", fake_embed)
+    kb._embed_queries(["a"])
+    vecs = kb._embed_queries(["bb", "a", "bb", "ccc"])
+
+    assert encoded == [["a"], ["bb", "ccc"]]
+    assert vecs[:, 0].tolist() == [2, 1, 2, 3]
+    assert kb.embed_stats() == {'hits': 2, 'misses': 3, 'size': 3, 'maxsize': knowledge.QUERY_CACHE_SIZE}
@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+from scribby_pi.llm import LLMClient
+
+
+def _findall_questions(content: str) -> list[str]:
+    # The whole-text parser generate_new_sparks used before responses were streamed.
+    questions = []
+    for q in re.findall(r"^\s*[-*]?\s*(.+?\?)", content.strip(), re.MULTILINE):
+        cleaned_q = q.strip().replace('"', '')
+        if not cleaned_q.lower().startswith(("based on", "here is")):
+            questions.append(cleaned_q)
+    return questions
+
+
+class _FakeStreamClient:
+    def __init__(self, pieces: list[str]):
+        self.pieces = pieces
+
+    async def chat(self, model, messages, stream=False):
+        assert stream
+
+        async def parts():
+            for piece in self.pieces:
+                yield {'message': {'content': piece}}
+
+        return parts()
+
+
+@pytest.mark.asyncio
+async def test_streamed_sparks_match_whole_text_parser():
+    content = (
+        "Here is what I wonder?\n"
+        "- How do \"tides\" shape coastlines?\n"
+        "Not a question.\n"
+        "\n"
+        "  * Why is the sky blue? And why at dusk?\n"
+        "Based on this, what next?\n"
+        "What do whales dream about?"
+    )
+    # Break lines mid-piece and leave the last line without a newline.
+    pieces = [content[i:i + 7] for i in range(0, len(content), 7)]
+    llm = LLMClient("test-model")
+    llm.client = _FakeStreamClient(pieces)
+
+    sparks = await llm.generate_new_sparks("Why?", "Some thoughts.")
+
+    assert sparks["raw_text"] == content
+    assert sparks["questions"] == _findall_questions(content)
+    assert sparks["questions"] == [
+        "How do tides shape coastlines?",
+        "Why is the sky blue?",
+        "What do whales dream about?",
+    ]